@@ -0,0 +1,280 @@
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+from rlenvs.obs_space import IntegerObsSpace
+
+from .condition import Condition
+from .indiv import Indiv, PolicyCacheIndiv
+from .rule import Rule
+
+_META_FILENAME = "meta.json"
+_DATA_FILE_EXT = ".dat"
+_DEFAULT_GENS_PER_CHUNK = 64
+_ACTION_DTYPE = "int64"
+_FITNESS_DTYPE = "float64"
+_REUSE_FLAG_DTYPE = "bool"
+
+# stands in for perf assessment res of rehydrated indivs, only perf is
+# archived
+ArchivedPerfAssessmentRes = namedtuple("ArchivedPerfAssessmentRes", ["perf"])
+
+
+def _calc_field_specs(meta):
+    """Field name -> (dtype, shape of single gen row) for each archive data
+    file."""
+    pop_size = meta["pop_size"]
+    indiv_size = meta["indiv_size"]
+    return {
+        "alleles": (meta["allele_dtype"],
+                    (pop_size, indiv_size, meta["num_cond_alleles"])),
+        "actions": (_ACTION_DTYPE, (pop_size, indiv_size)),
+        "fitnesses": (_FITNESS_DTYPE, (pop_size, )),
+        "reuse_flags": (_REUSE_FLAG_DTYPE, (pop_size, ))
+    }
+
+
+def _make_data_file_path(dir_path, field_name):
+    return os.path.join(dir_path, f"{field_name}{_DATA_FILE_EXT}")
+
+
+def _read_meta(dir_path):
+    with open(os.path.join(dir_path, _META_FILENAME), "r") as fp:
+        return json.load(fp)
+
+
+def _write_meta(dir_path, meta):
+    # write to tmp file then swap in, so readers never see a partial file
+    meta_path = os.path.join(dir_path, _META_FILENAME)
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(meta, fp)
+    os.replace(tmp_path, meta_path)
+
+
+class ArchiveWriter:
+    """Appends each gen's pop to memory-mapped data files in dir_path, one
+    file per field, each holding one row per gen. Files are grown in chunks
+    of gens_per_chunk gens, so the cost of appending a gen does not grow with
+    the length of the run.
+
+    If num_run_gens (number of gens run after the init pop) is given, files
+    are preallocated for the init pop plus num_run_gens gens, as PPL appends
+    once after init and once after every gen. num_gens counts all archived
+    gens, including the init pop.
+
+    Refuses to write into dir_path if it already holds an archive, unless
+    overwrite is set.
+
+    When pickled (e.g. as part of a checkpointed PPL), memmaps are dropped
+    and the archive is reopened on next append. Reopening rewinds the
+    archive on disk to the state at pickling time, discarding any gens
+    archived after that, so that a run resumed from an older checkpoint
+    continues a consistent archive."""
+    def __init__(self,
+                 dir_path,
+                 encoding,
+                 num_run_gens=None,
+                 gens_per_chunk=_DEFAULT_GENS_PER_CHUNK,
+                 overwrite=False):
+        assert gens_per_chunk >= 1
+        assert overwrite or \
+            not os.path.exists(os.path.join(dir_path, _META_FILENAME))
+        self._dir_path = dir_path
+        self._encoding = encoding
+        if num_run_gens is not None:
+            assert num_run_gens >= 0
+            # + 1 for init pop
+            self._init_capacity = (num_run_gens + 1)
+        else:
+            self._init_capacity = gens_per_chunk
+        self._gens_per_chunk = gens_per_chunk
+        # meta and memmaps are created on first append, when pop and indiv
+        # size are known
+        self._meta = None
+        self._memmaps = None
+        self._is_closed = False
+
+    @property
+    def num_gens(self):
+        return (self._meta["num_gens"] if self._meta is not None else 0)
+
+    def append(self, pop, reuse_flags):
+        """Archives pop as next gen. reuse_flags[i] says whether pop[i]
+        reused a previous perf assessment result rather than being
+        assessed this gen."""
+        assert not self._is_closed
+        assert len(reuse_flags) == len(pop)
+        if self._meta is None:
+            self._create(pop)
+        elif self._memmaps is None:
+            self._reopen()
+
+        gen_idx = self._meta["num_gens"]
+        if gen_idx == self._meta["capacity"]:
+            self._grow(self._meta["capacity"] + self._gens_per_chunk)
+
+        self._memmaps["alleles"][gen_idx] = \
+            [[rule.condition.alleles for rule in indiv.rules]
+             for indiv in pop]
+        self._memmaps["actions"][gen_idx] = \
+            [[rule.action for rule in indiv.rules] for indiv in pop]
+        self._memmaps["fitnesses"][gen_idx] = \
+            [indiv.fitness for indiv in pop]
+        self._memmaps["reuse_flags"][gen_idx] = reuse_flags
+        self._flush_memmaps()
+
+        # only bump num_gens once data is flushed, so readers of in progress
+        # runs never see incomplete gens
+        self._meta["num_gens"] += 1
+        _write_meta(self._dir_path, self._meta)
+
+    def close(self):
+        self._flush_memmaps()
+        self._memmaps = None
+        self._is_closed = True
+
+    def __getstate__(self):
+        # don't copy memmaps when pickled, see class docstring
+        self._flush_memmaps()
+        state = self.__dict__.copy()
+        state["_memmaps"] = None
+        return state
+
+    def _flush_memmaps(self):
+        if self._memmaps is not None:
+            for memmap in self._memmaps.values():
+                memmap.flush()
+
+    def _create(self, pop):
+        os.makedirs(self._dir_path, exist_ok=True)
+        indiv_size = len(pop[0])
+        assert all(len(indiv) == indiv_size for indiv in pop)
+        if isinstance(self._encoding.obs_space, IntegerObsSpace):
+            allele_dtype = "int64"
+        else:
+            allele_dtype = "float64"
+        self._meta = {
+            "pop_size": len(pop),
+            "indiv_size": indiv_size,
+            # 2 alleles for interval on each dim
+            "num_cond_alleles": (2 * len(self._encoding.obs_space)),
+            "allele_dtype": allele_dtype,
+            "use_policy_cache": isinstance(pop[0], PolicyCacheIndiv),
+            "capacity": self._init_capacity,
+            "num_gens": 0
+        }
+        self._memmaps = {}
+        for (field_name, (dtype, row_shape)) in \
+                _calc_field_specs(self._meta).items():
+            self._memmaps[field_name] = np.memmap(
+                _make_data_file_path(self._dir_path, field_name),
+                dtype=dtype,
+                mode="w+",
+                shape=(self._meta["capacity"], *row_shape))
+        _write_meta(self._dir_path, self._meta)
+
+    def _reopen(self):
+        """Rewinds archive on disk to self._meta (see class docstring), then
+        remaps it."""
+        self._resize_data_files(self._meta["capacity"])
+        _write_meta(self._dir_path, self._meta)
+        self._open_memmaps(self._meta["capacity"])
+
+    def _grow(self, new_capacity):
+        assert new_capacity > self._meta["capacity"]
+        self._flush_memmaps()
+        self._memmaps = None
+        # extend files in place (new tail is zero filled)
+        self._resize_data_files(new_capacity)
+        self._open_memmaps(new_capacity)
+        self._meta["capacity"] = new_capacity
+        _write_meta(self._dir_path, self._meta)
+
+    def _resize_data_files(self, capacity):
+        for (field_name, (dtype, row_shape)) in \
+                _calc_field_specs(self._meta).items():
+            data_file_path = _make_data_file_path(self._dir_path, field_name)
+            with open(data_file_path, "r+b") as fp:
+                fp.truncate(
+                    int(np.prod((capacity, *row_shape))) *
+                    np.dtype(dtype).itemsize)
+
+    def _open_memmaps(self, capacity):
+        self._memmaps = {}
+        for (field_name, (dtype, row_shape)) in \
+                _calc_field_specs(self._meta).items():
+            self._memmaps[field_name] = np.memmap(
+                _make_data_file_path(self._dir_path, field_name),
+                dtype=dtype,
+                mode="r+",
+                shape=(capacity, *row_shape))
+
+
+class ArchiveReader:
+    """Read-only view of archive written by ArchiveWriter. Field arrays are
+    memory-mapped and indexed [gen_idx, indiv_idx, ...], so slicing them only
+    reads the requested rows from disk."""
+    def __init__(self, dir_path, encoding):
+        self._encoding = encoding
+        meta = _read_meta(dir_path)
+        self._num_gens = meta["num_gens"]
+        self._indiv_cls = \
+            (PolicyCacheIndiv if meta["use_policy_cache"] else Indiv)
+        self._fields = {}
+        for (field_name, (dtype, row_shape)) in \
+                _calc_field_specs(meta).items():
+            memmap = np.memmap(_make_data_file_path(dir_path, field_name),
+                               dtype=dtype,
+                               mode="r",
+                               shape=(meta["capacity"], *row_shape))
+            # hide unwritten tail of last chunk
+            self._fields[field_name] = memmap[:self._num_gens]
+
+    @property
+    def num_gens(self):
+        return self._num_gens
+
+    @property
+    def alleles(self):
+        return self._fields["alleles"]
+
+    @property
+    def actions(self):
+        return self._fields["actions"]
+
+    @property
+    def fitnesses(self):
+        return self._fields["fitnesses"]
+
+    @property
+    def reuse_flags(self):
+        return self._fields["reuse_flags"]
+
+    def get_pop(self, gen_idx):
+        pop_alleles = self.alleles[gen_idx]
+        pop_actions = self.actions[gen_idx]
+        pop_fitnesses = self.fitnesses[gen_idx]
+        return [
+            self._make_indiv(indiv_alleles, indiv_actions, fitness)
+            for (indiv_alleles, indiv_actions, fitness) in zip(
+                pop_alleles, pop_actions, pop_fitnesses)
+        ]
+
+    def get_indiv(self, gen_idx, indiv_idx):
+        return self._make_indiv(self.alleles[gen_idx, indiv_idx],
+                                self.actions[gen_idx, indiv_idx],
+                                self.fitnesses[gen_idx, indiv_idx])
+
+    def _make_indiv(self, indiv_alleles, indiv_actions, fitness):
+        """Rehydrated indivs are of the same class as in the run, with an
+        ArchivedPerfAssessmentRes holding their archived fitness."""
+        rules = [
+            Rule(Condition(cond_alleles, self._encoding), action)
+            for (cond_alleles, action) in zip(indiv_alleles.tolist(),
+                                              indiv_actions.tolist())
+        ]
+        indiv = self._indiv_cls(rules)
+        indiv.perf_assessment_res = ArchivedPerfAssessmentRes(float(fitness))
+        return indiv
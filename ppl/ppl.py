@@ -1,5 +1,6 @@
 import copy
 import logging
+import math
 import os
 from multiprocessing import Pool
 
@@ -9,14 +10,23 @@ from .ga import crossover, mutate, tournament_selection
 from .hyperparams import get_hyperparam as get_hp
 from .hyperparams import register_hyperparams
 from .init import init_pop
-from .rng import seed_rng
+from .rng import seed_rng, spawn_substream_seed_seqs, use_substream
 
 _NUM_CPUS = int(os.environ['SLURM_JOB_CPUS_PER_NODE'])
 _USE_PARALLEL = True
+# breeding rounds are cheap relative to perf assessment, so pool overhead
+# (shipping pop to workers and offspring back) can outweigh gains for small
+# pops; offspring are the same either way
+_USE_PARALLEL_BREEDING = False
+
+# state shared with breeding worker procs, set once per worker by
+# _init_breeding_worker_proc rather than being pickled for every breeding
+# round
+_breeding_state = None
 
 
 class PPL:
-    def __init__(self, env, encoding, hyperparams_dict):
+    def __init__(self, env, encoding, hyperparams_dict, archive_writer=None):
         self._env = env
         self._selectable_actions = self._env.action_space
         self._encoding = encoding
@@ -24,6 +34,8 @@ class PPL:
         register_hyperparams(self._hyperparams_dict)
         seed_rng(get_hp("seed"))
         self._pop = None
+        self._gen_idx = None
+        self._archive_writer = archive_writer
 
     @property
     def pop(self):
@@ -31,28 +43,61 @@ class PPL:
 
     def init(self):
         self._pop = init_pop(self._encoding, self._selectable_actions)
-        self._assess_pop_perf(self._pop, parallel=_USE_PARALLEL)
+        reuse_flags = self._assess_pop_perf(self._pop, parallel=_USE_PARALLEL)
+        self._gen_idx = 0
+        self._archive_pop(self._pop, reuse_flags)
         return self._pop
 
     def run_gen(self):
+        self._gen_idx += 1
+        new_pop = self._breed_new_pop(self._pop,
+                                      parallel=_USE_PARALLEL_BREEDING)
+        reuse_flags = self._assess_pop_perf(new_pop, parallel=_USE_PARALLEL)
+        self._pop = new_pop
+        self._archive_pop(self._pop, reuse_flags)
+        return self._pop
+
+    def _breed_new_pop(self, pop, parallel=True):
         pop_size = get_hp("pop_size")
         assert (pop_size % 2) == 0
         num_breeding_rounds = (pop_size // 2)
-        new_pop = []
-        for _ in range(num_breeding_rounds):
-            parent_a = copy.deepcopy(tournament_selection(self._pop))
-            parent_b = copy.deepcopy(tournament_selection(self._pop))
-            (child_a, child_b) = crossover(parent_a, parent_b, self._encoding)
-            for child in (child_a, child_b):
-                mutate(child, self._encoding, self._selectable_actions)
-                new_pop.append(child)
+        # each breeding round gets its own rng substream, so new pop is the
+        # same regardless of whether / how rounds are parallelised
+        seed_seqs = spawn_substream_seed_seqs(self._gen_idx,
+                                              num_breeding_rounds)
+        breeding_state = (pop, self._encoding, self._selectable_actions)
+        if parallel:
+            # process parallelism for breeding
+            with Pool(_NUM_CPUS,
+                      initializer=_init_breeding_worker_proc,
+                      initargs=(self._hyperparams_dict,
+                                breeding_state)) as pool:
+                # one chunk of rounds per worker to amortise ipc overhead
+                chunksize = math.ceil(num_breeding_rounds / _NUM_CPUS)
+                results = pool.map(_run_breeding_round,
+                                   seed_seqs,
+                                   chunksize=chunksize)
+        else:
+            # serial breeding for debugging / profiling
+            _set_breeding_state(breeding_state)
+            try:
+                results = [
+                    _run_breeding_round(seed_seq) for seed_seq in seed_seqs
+                ]
+            finally:
+                _set_breeding_state(None)
 
+        new_pop = []
+        for (child_a, child_b) in results:
+            new_pop.append(child_a)
+            new_pop.append(child_b)
         assert len(new_pop) == pop_size
-        self._assess_pop_perf(new_pop, parallel=_USE_PARALLEL)
-        self._pop = new_pop
-        return self._pop
+        return new_pop
 
     def _assess_pop_perf(self, pop, parallel=True):
+        """Assesses perf of indivs in pop that need it; returns flags saying
+        which indivs reused their existing perf assessment res."""
+        reuse_flags = [indiv.perf_assessment_res is not None for indiv in pop]
         needs_assessment = [
             indiv for indiv in pop if indiv.perf_assessment_res is None
         ]
@@ -82,5 +127,35 @@ class PPL:
         for indiv in pop:
             assert indiv.perf_assessment_res is not None
 
+        return reuse_flags
+
     def _assess_indiv_perf(self, indiv, num_rollouts, gamma):
         return assess_perf(self._env, indiv, num_rollouts, gamma)
+
+    def _archive_pop(self, pop, reuse_flags):
+        if self._archive_writer is not None:
+            self._archive_writer.append(pop, reuse_flags)
+
+
+def _init_breeding_worker_proc(hyperparams_dict, breeding_state):
+    # worker procs do not necessarily inherit module state from master (e.g.
+    # with spawn / forkserver start methods), so set it up explicitly
+    register_hyperparams(hyperparams_dict)
+    seed_rng(get_hp("seed"))
+    _set_breeding_state(breeding_state)
+
+
+def _set_breeding_state(breeding_state):
+    global _breeding_state
+    _breeding_state = breeding_state
+
+
+def _run_breeding_round(seed_seq):
+    (pop, encoding, selectable_actions) = _breeding_state
+    with use_substream(seed_seq):
+        parent_a = copy.deepcopy(tournament_selection(pop))
+        parent_b = copy.deepcopy(tournament_selection(pop))
+        (child_a, child_b) = crossover(parent_a, parent_b, encoding)
+        for child in (child_a, child_b):
+            mutate(child, encoding, selectable_actions)
+    return (child_a, child_b)
@@ -1,16 +1,50 @@
+import contextlib
+
 import numpy as np
 
 _rng = np.random.RandomState()
+_seed = None
 _has_been_seeded = False
+# rng for currently active substream (if any), overrides global rng
+_substream_rng = None
 
 
 def seed_rng(seed):
     seed = int(seed)
     _rng.seed(seed)
+    global _seed
+    _seed = seed
     global _has_been_seeded
     _has_been_seeded = True
 
 
 def get_rng():
     assert _has_been_seeded
-    return _rng
+    if _substream_rng is not None:
+        return _substream_rng
+    else:
+        return _rng
+
+
+def spawn_substream_seed_seqs(gen_idx, num_substreams):
+    """Spawns independent seed seqs for num_substreams substreams, derived
+    only from the run seed and gen_idx, so that draws made within each
+    substream do not depend on how work is scheduled."""
+    assert _has_been_seeded
+    gen_seed_seq = np.random.SeedSequence(entropy=_seed,
+                                          spawn_key=(gen_idx, ))
+    return gen_seed_seq.spawn(num_substreams)
+
+
+@contextlib.contextmanager
+def use_substream(seed_seq):
+    """Makes get_rng() return rng for given substream within the context.
+    Substream rng is a RandomState (backed by its own bit generator) so that
+    it exposes the same interface as the global rng."""
+    global _substream_rng
+    assert _substream_rng is None
+    _substream_rng = np.random.RandomState(np.random.MT19937(seed_seq))
+    try:
+        yield _substream_rng
+    finally:
+        _substream_rng = None
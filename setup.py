@@ -19,7 +19,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=[
-        "numpy",
+        "numpy>=1.17",
         "gym"
     ],
     python_requires='>=3.6',
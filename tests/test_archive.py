@@ -0,0 +1,237 @@
+import os
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("rlenvs")
+os.environ.setdefault("SLURM_JOB_CPUS_PER_NODE", "2")
+
+from rlenvs.obs_space import IntegerObsSpace, RealObsSpace  # noqa: E402
+
+import ppl.ppl as ppl_module  # noqa: E402
+from ppl.archive import ArchiveReader, ArchiveWriter  # noqa: E402
+from ppl.encoding import (IntegerUnorderedBoundEncoding,  # noqa: E402
+                          RealUnorderedBoundEncoding)
+from ppl.indiv import Indiv, PolicyCacheIndiv  # noqa: E402
+from ppl.interval import IntegerInterval, RealInterval  # noqa: E402
+from ppl.ppl import PPL  # noqa: E402
+
+_HYPERPARAMS_DICT = {
+    "seed": 0,
+    "pop_size": 6,
+    "indiv_size": 3,
+    "tourn_size": 2,
+    "p_cross": 0.7,
+    "p_cross_swap": 0.5,
+    "p_mut": 0.3,
+    "mut_sigma_pcnt": 0.1,
+    "r_nought": 0.1,
+    "num_rollouts": 1,
+    "gamma": 1.0,
+    "use_indiv_policy_cache": False
+}
+_SELECTABLE_ACTIONS = [0, 1, 2]
+
+
+def _make_dim(lower, upper, interval_cls):
+    return SimpleNamespace(lower=lower,
+                           upper=upper,
+                           span=interval_cls(lower, upper).span)
+
+
+def _make_encoding(is_integer):
+    if is_integer:
+        return IntegerUnorderedBoundEncoding(
+            IntegerObsSpace([
+                _make_dim(0, 9, IntegerInterval),
+                _make_dim(-5, 5, IntegerInterval)
+            ]))
+    else:
+        return RealUnorderedBoundEncoding(
+            RealObsSpace([
+                _make_dim(0.0, 1.0, RealInterval),
+                _make_dim(-2.0, 2.0, RealInterval)
+            ]))
+
+
+def _fake_assess_perf(env, indiv, num_rollouts, gamma):
+    return SimpleNamespace(perf=float(
+        sum(rule.action + rule.condition.alleles[0] for rule in indiv.rules)))
+
+
+@pytest.fixture(autouse=True)
+def _serial_fake_assessment(monkeypatch):
+    monkeypatch.setattr(ppl_module, "_USE_PARALLEL", False)
+    monkeypatch.setattr(ppl_module, "assess_perf", _fake_assess_perf)
+
+
+def _make_ppl(writer, encoding, use_policy_cache=False):
+    env = SimpleNamespace(action_space=_SELECTABLE_ACTIONS)
+    hyperparams_dict = {
+        **_HYPERPARAMS_DICT, "use_indiv_policy_cache": use_policy_cache
+    }
+    return PPL(env, encoding, hyperparams_dict, archive_writer=writer)
+
+
+def _genotypes(pop):
+    return [[(list(rule.condition.alleles), rule.action)
+             for rule in indiv.rules] for indiv in pop]
+
+
+def _fitnesses(pop):
+    return [indiv.fitness for indiv in pop]
+
+
+def _run(ppl, num_run_gens):
+    """Returns list of pops (init pop + num_run_gens gens)."""
+    pops = [list(ppl.init())]
+    for _ in range(num_run_gens):
+        pops.append(list(ppl.run_gen()))
+    return pops
+
+
+def _assert_archive_matches(reader, pops):
+    assert reader.num_gens == len(pops)
+    for (gen_idx, pop) in enumerate(pops):
+        archived_pop = reader.get_pop(gen_idx)
+        assert _genotypes(archived_pop) == _genotypes(pop)
+        assert _fitnesses(archived_pop) == _fitnesses(pop)
+
+
+def test_grows_past_chunk(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding, gens_per_chunk=2)
+    pops = _run(_make_ppl(writer, encoding), num_run_gens=4)
+    assert writer.num_gens == 5
+    assert writer._meta["capacity"] == 6
+    _assert_archive_matches(ArchiveReader(tmp_path, encoding), pops)
+
+
+def test_preallocated_does_not_grow(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path,
+                           encoding,
+                           num_run_gens=3,
+                           gens_per_chunk=1)
+    pops = _run(_make_ppl(writer, encoding), num_run_gens=3)
+    assert writer.num_gens == 4
+    assert writer._meta["capacity"] == 4
+    _assert_archive_matches(ArchiveReader(tmp_path, encoding), pops)
+
+
+@pytest.mark.parametrize("is_integer, allele_dtype", [(True, np.int64),
+                                                      (False, np.float64)])
+def test_reader_slicing(tmp_path, is_integer, allele_dtype):
+    encoding = _make_encoding(is_integer)
+    writer = ArchiveWriter(tmp_path, encoding, gens_per_chunk=2)
+    pops = _run(_make_ppl(writer, encoding), num_run_gens=2)
+    reader = ArchiveReader(tmp_path, encoding)
+    pop_size = _HYPERPARAMS_DICT["pop_size"]
+    indiv_size = _HYPERPARAMS_DICT["indiv_size"]
+    num_cond_alleles = (2 * len(encoding.obs_space))
+
+    assert reader.num_gens == 3
+    assert reader.alleles.shape == \
+        (3, pop_size, indiv_size, num_cond_alleles)
+    assert reader.alleles.dtype == allele_dtype
+    assert reader.actions.shape == (3, pop_size, indiv_size)
+    assert reader.actions.dtype == np.int64
+    assert reader.fitnesses.shape == (3, pop_size)
+    assert reader.fitnesses.dtype == np.float64
+    assert reader.reuse_flags.shape == (3, pop_size)
+    assert reader.reuse_flags.dtype == np.bool_
+
+    assert reader.alleles[1, 2].shape == (indiv_size, num_cond_alleles)
+    assert reader.alleles[1, 2].tolist() == \
+        [rule.condition.alleles for rule in pops[1][2].rules]
+    assert reader.alleles[-1, -1].tolist() == \
+        [rule.condition.alleles for rule in pops[-1][-1].rules]
+    assert reader.actions[-1].tolist() == \
+        [[rule.action for rule in indiv.rules] for indiv in pops[-1]]
+    assert reader.fitnesses[-1].tolist() == _fitnesses(pops[-1])
+
+
+@pytest.mark.parametrize("is_integer", [True, False])
+@pytest.mark.parametrize("use_policy_cache", [True, False])
+def test_rehydration_round_trips(tmp_path, is_integer, use_policy_cache):
+    encoding = _make_encoding(is_integer)
+    writer = ArchiveWriter(tmp_path, encoding)
+    pops = _run(_make_ppl(writer, encoding, use_policy_cache),
+                num_run_gens=2)
+    reader = ArchiveReader(tmp_path, encoding)
+    _assert_archive_matches(reader, pops)
+
+    indiv = reader.get_indiv(-1, 1)
+    assert _genotypes([indiv]) == _genotypes([pops[-1][1]])
+    assert indiv.fitness == pops[-1][1].fitness
+    expected_cls = (PolicyCacheIndiv if use_policy_cache else Indiv)
+    assert type(indiv) is expected_cls
+
+
+def test_init_pop_reuse_flags_all_false(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding)
+    pops = _run(_make_ppl(writer, encoding), num_run_gens=1)
+    reader = ArchiveReader(tmp_path, encoding)
+    assert not reader.reuse_flags[0].any()
+    assert reader.reuse_flags.shape == (2, len(pops[0]))
+
+
+def test_overwrite_guard(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding)
+    _run(_make_ppl(writer, encoding), num_run_gens=1)
+
+    with pytest.raises(AssertionError):
+        ArchiveWriter(tmp_path, encoding)
+
+    writer = ArchiveWriter(tmp_path, encoding, overwrite=True)
+    pops = _run(_make_ppl(writer, encoding), num_run_gens=0)
+    _assert_archive_matches(ArchiveReader(tmp_path, encoding), pops)
+
+
+def test_append_after_close_fails(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding)
+    ppl = _make_ppl(writer, encoding)
+    ppl.init()
+    writer.close()
+    with pytest.raises(AssertionError):
+        ppl.run_gen()
+
+
+def test_pickled_ppl_keeps_archiving(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding, gens_per_chunk=2)
+    ppl = _make_ppl(writer, encoding)
+    pops = _run(ppl, num_run_gens=2)
+
+    restored_ppl = pickle.loads(pickle.dumps(ppl))
+    for _ in range(3):
+        pops.append(list(restored_ppl.run_gen()))
+
+    _assert_archive_matches(ArchiveReader(tmp_path, encoding), pops)
+
+
+def test_restoring_older_checkpoint_rewinds_archive(tmp_path):
+    encoding = _make_encoding(is_integer=False)
+    writer = ArchiveWriter(tmp_path, encoding, gens_per_chunk=2)
+    ppl = _make_ppl(writer, encoding)
+    pops = _run(ppl, num_run_gens=1)
+    checkpoint = pickle.dumps(ppl)
+    for _ in range(5):
+        ppl.run_gen()
+    assert ArchiveReader(tmp_path, encoding).num_gens == 7
+
+    restored_ppl = pickle.loads(checkpoint)
+    pops.append(list(restored_ppl.run_gen()))
+
+    _assert_archive_matches(ArchiveReader(tmp_path, encoding), pops)
+    # data files are rewound to capacity of restored writer
+    capacity = restored_ppl._archive_writer._meta["capacity"]
+    assert capacity == 4
+    assert os.path.getsize(tmp_path / "fitnesses.dat") == \
+        (capacity * _HYPERPARAMS_DICT["pop_size"] *
+         np.dtype(np.float64).itemsize)
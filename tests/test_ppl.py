@@ -0,0 +1,82 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("rlenvs")
+os.environ.setdefault("SLURM_JOB_CPUS_PER_NODE", "2")
+
+from rlenvs.obs_space import RealObsSpace  # noqa: E402
+
+import ppl.ppl as ppl_module  # noqa: E402
+from ppl.encoding import RealUnorderedBoundEncoding  # noqa: E402
+from ppl.init import init_pop  # noqa: E402
+from ppl.interval import RealInterval  # noqa: E402
+from ppl.ppl import PPL  # noqa: E402
+from ppl.rng import get_rng  # noqa: E402
+
+_HYPERPARAMS_DICT = {
+    "seed": 0,
+    "pop_size": 12,
+    "indiv_size": 4,
+    "tourn_size": 3,
+    "p_cross": 0.7,
+    "p_cross_swap": 0.5,
+    "p_mut": 0.3,
+    "mut_sigma_pcnt": 0.1,
+    "r_nought": 0.1,
+    "use_indiv_policy_cache": False
+}
+_SELECTABLE_ACTIONS = [0, 1, 2]
+_NUMS_CPUS = [1, 2, 3]
+
+
+def _make_dim(lower, upper):
+    return SimpleNamespace(lower=lower,
+                           upper=upper,
+                           span=RealInterval(lower, upper).span)
+
+
+def _make_ppl():
+    obs_space = RealObsSpace([_make_dim(0.0, 1.0), _make_dim(-2.0, 2.0)])
+    encoding = RealUnorderedBoundEncoding(obs_space)
+    env = SimpleNamespace(action_space=_SELECTABLE_ACTIONS)
+    ppl = PPL(env, encoding, _HYPERPARAMS_DICT)
+    pop = init_pop(encoding, _SELECTABLE_ACTIONS)
+    for indiv in pop:
+        indiv.perf_assessment_res = SimpleNamespace(perf=get_rng().random())
+    ppl._gen_idx = 1
+    return (ppl, pop)
+
+
+def _genotypes(pop):
+    return [[(list(rule.condition.alleles), rule.action)
+             for rule in indiv.rules] for indiv in pop]
+
+
+def test_breeding_same_serial_and_any_num_cpus(monkeypatch):
+    (ppl, pop) = _make_ppl()
+    serial_genotypes = _genotypes(ppl._breed_new_pop(pop, parallel=False))
+    assert len(serial_genotypes) == len(pop)
+
+    for num_cpus in _NUMS_CPUS:
+        monkeypatch.setattr(ppl_module, "_NUM_CPUS", num_cpus)
+        parallel_pop = ppl._breed_new_pop(pop, parallel=True)
+        assert _genotypes(parallel_pop) == serial_genotypes
+
+
+def test_breeding_differs_between_gens():
+    (ppl, pop) = _make_ppl()
+    gen_1_genotypes = _genotypes(ppl._breed_new_pop(pop, parallel=False))
+    ppl._gen_idx = 2
+    gen_2_genotypes = _genotypes(ppl._breed_new_pop(pop, parallel=False))
+    assert gen_1_genotypes != gen_2_genotypes
+
+
+def test_breeding_same_for_fresh_ppls_with_same_seed():
+    (ppl_a, pop_a) = _make_ppl()
+    genotypes_a = _genotypes(ppl_a._breed_new_pop(pop_a, parallel=False))
+    (ppl_b, pop_b) = _make_ppl()
+    genotypes_b = _genotypes(ppl_b._breed_new_pop(pop_b, parallel=False))
+    assert _genotypes(pop_a) == _genotypes(pop_b)
+    assert genotypes_a == genotypes_b